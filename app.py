@@ -1,11 +1,23 @@
 import streamlit as st
 import geopandas as gpd
 import folium
-from streamlit_folium import st_folium
+import streamlit.components.v1 as components
 import os
+import json
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from folium.plugins import MeasureControl, MousePosition, Draw, Fullscreen, MarkerCluster
+import altair as alt
+import shapely
+from folium.plugins import MeasureControl, MousePosition, Draw, Fullscreen, MarkerCluster, VectorGridProtobuf
+from branca.element import MacroElement
+from jinja2 import Template
+
+try:
+    from numba import njit
+except ImportError:
+    # Sin numba el mismo kernel se ejecuta en Python puro
+    def njit(*args, **kwargs):
+        return lambda func: func
 
 # Configuración de la página
 st.set_page_config(layout="wide")
@@ -14,6 +26,47 @@ st.title("🌍 Mapa Interactivo de México - Tipo ArcGIS")
 # Verificar existencia del archivo
 estados_file = "georef-mexico-state.geojson"
 
+# Elipsoide WGS84: radio autálico (m) y excentricidad para pasar la latitud
+# geodésica a latitud autálica (esfera de igual área que el elipsoide)
+RADIO_TIERRA = 6371007.181
+_APLANAMIENTO = 1 / 298.257223563
+E2_WGS84 = _APLANAMIENTO * (2 - _APLANAMIENTO)
+E_WGS84 = E2_WGS84 ** 0.5
+# q(90°) de la fórmula de latitud autálica
+QP_WGS84 = (1 - E2_WGS84) * (1 / (1 - E2_WGS84)
+                             - np.log((1 - E_WGS84) / (1 + E_WGS84)) / (2 * E_WGS84))
+
+# Capitales servidas como archivo estático (ver enableStaticServing en .streamlit/config.toml)
+CAPITALES_URL = "/app/static/capitales.json"
+
+# Capas base: nombre -> (tiles, atribución). Stamen ahora se sirve desde Stadia Maps
+ATRIBUCION_STAMEN = '&copy; <a href="https://stadiamaps.com/">Stadia Maps</a> &copy; <a href="https://stamen.com/">Stamen Design</a> &copy; <a href="https://openmaptiles.org/">OpenMapTiles</a> &copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
+CAPAS_BASE = {
+    "CartoDB positron": ("CartoDB positron", "CartoDB attribution"),
+    "OpenStreetMap": (
+        "OpenStreetMap",
+        '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
+    ),
+    "Stamen Terrain": (
+        "https://tiles.stadiamaps.com/tiles/stamen_terrain/{z}/{x}/{y}{r}.png",
+        ATRIBUCION_STAMEN
+    ),
+    "Stamen Toner": (
+        "https://tiles.stadiamaps.com/tiles/stamen_toner/{z}/{x}/{y}{r}.png",
+        ATRIBUCION_STAMEN
+    ),
+}
+# Capas base adicionales que se ofrecen en el control de capas
+EXTRA_TILES = ["OpenStreetMap", "Stamen Terrain", "Stamen Toner"]
+
+# Pirámide de teselas vectoriales de los estados (se genera con build_tiles.sh);
+# si no existe, el mapa usa la capa GeoJSON
+TILES_DIR = os.path.join("static", "tiles", "estados")
+TILES_URL = "/app/static/tiles/estados/{z}/{x}/{y}.pbf"
+
+# Tolerancia (en grados) para simplificar polígonos, ajustada a zoom 5
+TOLERANCIA_SIMPLIFICACION = 0.01
+
 if not os.path.exists(estados_file):
     st.error(f"""
     No se encontró el archivo GeoJSON. Por favor asegúrate de que:
@@ -22,20 +75,137 @@ if not os.path.exists(estados_file):
     """)
     st.stop()
 
-@st.cache_data
+@njit(cache=True)
+def sin_authalic(lat):
+    # Seno de la latitud autálica para una latitud geodésica en radianes
+    s = np.sin(lat)
+    es = E_WGS84 * s
+    q = (1 - E2_WGS84) * (s / (1 - es * es) - np.log((1 - es) / (1 + es)) / (2 * E_WGS84))
+    return q / QP_WGS84
+
+@njit(cache=True)
+def ring_areas(x, y, starts):
+    # Área (m²) sobre el elipsoide WGS84 de cada anillo cerrado, usando la esfera
+    # autálica; x = lon, y = lat geodésica en grados
+    n_rings = starts.shape[0] - 1
+    areas = np.empty(n_rings, dtype=np.float64)
+    for r in range(n_rings):
+        total = 0.0
+        for i in range(starts[r], starts[r + 1] - 1):
+            lon1 = np.radians(x[i])
+            lon2 = np.radians(x[i + 1])
+            lat1 = np.radians(y[i])
+            lat2 = np.radians(y[i + 1])
+            total += (lon2 - lon1) * (2.0 + sin_authalic(lat1) + sin_authalic(lat2))
+        areas[r] = abs(total) * RADIO_TIERRA * RADIO_TIERRA / 2.0
+    return areas
+
+def geometry_areas_km2(geometries):
+    # Descomponer en polígonos y anillos para pasar arreglos planos al kernel
+    geoms = np.asarray(geometries)
+    partes, geom_parte = shapely.get_parts(geoms, return_index=True)
+    anillos, parte_anillo = shapely.get_rings(partes, return_index=True)
+    coords, anillo_coord = shapely.get_coordinates(anillos, return_index=True)
+
+    conteos = np.bincount(anillo_coord, minlength=len(anillos))
+    starts = np.concatenate(([0], np.cumsum(conteos))).astype(np.int64)
+    areas = ring_areas(
+        np.ascontiguousarray(coords[:, 0]),
+        np.ascontiguousarray(coords[:, 1]),
+        starts
+    )
+
+    # El primer anillo de cada polígono es el exterior; los demás son huecos
+    exterior = np.ones(len(anillos), dtype=bool)
+    exterior[1:] = parte_anillo[1:] != parte_anillo[:-1]
+    areas = np.where(exterior, areas, -areas)
+
+    return np.bincount(geom_parte[parte_anillo], weights=areas, minlength=len(geoms)) / 1e6
+
+@st.cache_data(persist="disk", show_spinner=False)
+def read_raw_states(filepath, mtime):
+    # Solo la lectura se guarda en disco: la llave del caché persistente depende
+    # del código de esta función y sus argumentos, no de las funciones que llame.
+    # mtime forma parte de la llave: si el GeoJSON cambia, se vuelve a leer
+    # Copia en formato columnar (parquet) que se genera en la primera carga
+    parquet_path = os.path.splitext(filepath)[0] + ".parquet"
+    if (os.path.exists(parquet_path)
+            and os.path.getmtime(parquet_path) >= os.path.getmtime(filepath)):
+        # Leer el parquet es mucho más rápido que parsear el GeoJSON
+        gdf = gpd.read_parquet(parquet_path)
+    else:
+        gdf = gpd.read_file(filepath)
+        try:
+            gdf.to_parquet(parquet_path)
+        except (ImportError, OSError):
+            # Sin pyarrow o sin permisos de escritura: seguimos con el GeoJSON
+            pass
+    return gdf
+
+@st.cache_data(show_spinner=False)
+def read_states(filepath, mtime):
+    # Área, categorías y simplificación en caché de memoria (se recalculan al
+    # reiniciar, así los cambios en estas funciones siempre se aplican)
+    gdf = read_raw_states(filepath, mtime).copy()
+    # Calcular el área una sola vez (km²) directamente en lon/lat
+    gdf["area_km2"] = geometry_areas_km2(gdf.geometry)
+    # Lista ordenada de estados para el filtro, calculada una sola vez
+    estados_sorted = np.sort(gdf['sta_name'].unique())
+    # Columnas de texto de baja cardinalidad como categóricas (isin/value_counts sobre códigos)
+    for col in ('sta_name', 'sta_type', 'sta_code'):
+        gdf[col] = gdf[col].astype('category')
+    # Simplificar geometrías para el mapa (después de calcular el área)
+    gdf["geometry"] = gdf.geometry.simplify(TOLERANCIA_SIMPLIFICACION, preserve_topology=True)
+    return gdf, estados_sorted
+
 def load_local_geojson(filepath):
+    # Los errores no se guardan en caché: se muestran y se reintenta en la siguiente ejecución
     try:
-        return gpd.read_file(filepath)
+        return read_states(filepath, os.path.getmtime(filepath))
     except Exception as e:
         st.error(f"Error al cargar {filepath}: {str(e)}")
         return None
 
+@st.cache_data(show_spinner=False)
+def load_state_features(filepath, mtime):
+    # Serializar una sola vez cada estado como Feature GeoJSON (texto)
+    gdf, _ = read_states(filepath, mtime)
+    # Solo las columnas que usa el tooltip (geo_point_2d, por ejemplo, llega
+    # como arreglo y no es serializable a JSON)
+    gdf_mapa = gdf[['sta_name', 'sta_code', 'sta_type', 'geometry']]
+    # drop_id: el índice como "id" de cada Feature tampoco lo usa el mapa
+    coleccion = json.loads(gdf_mapa.to_json(drop_id=True))
+    return {
+        feature["properties"]["sta_name"]: json.dumps(feature)
+        for feature in coleccion["features"]
+    }
+
+def load_tiles_maxzoom(tiles_dir):
+    # Zoom máximo de la pirámide según el metadata.json de tippecanoe; sin caché
+    # (es un archivo pequeño) para detectar teselas generadas con el servidor activo
+    metadata_path = os.path.join(tiles_dir, "metadata.json")
+    if not os.path.exists(metadata_path):
+        return None
+    with open(metadata_path, encoding="utf-8") as f:
+        return int(json.load(f)["maxzoom"])
+
+def join_features(features, seleccion):
+    # Armar el FeatureCollection uniendo textos, sin recorrer geometrías
+    nombres = seleccion if seleccion else features.keys()
+    return ('{"type": "FeatureCollection", "features": ['
+            + ", ".join(features[nombre] for nombre in nombres)
+            + ']}')
+
 # Cargar solo los datos de estados
-gdf_estados = load_local_geojson(estados_file)
+datos_estados = load_local_geojson(estados_file)
 
-if gdf_estados is None:
+if datos_estados is None:
     st.stop()
 
+gdf_estados, estados_disponibles = datos_estados
+# Versión de los datos para las llaves de los cachés que reciben _gdf
+estados_mtime = os.path.getmtime(estados_file)
+
 # ================== SECCIÓN DE FILTRO DE ESTADOS ==================
 
 # Barra lateral con filtros
@@ -46,7 +216,6 @@ with st.sidebar:
     
 
 st.sidebar.header("🔍 Filtro por Estado")
-estados_disponibles = gdf_estados['sta_name'].sort_values().unique()
 
 estado_seleccionado = st.sidebar.multiselect(
     "Selecciona uno o más estados (deja vacío para todos)",
@@ -54,67 +223,80 @@ estado_seleccionado = st.sidebar.multiselect(
     default=estados_disponibles  # Por defecto selecciona todos
 )
 
-# Filtrar según selección múltiple
-if estado_seleccionado:
-    gdf_filtrado = gdf_estados[gdf_estados['sta_name'].isin(estado_seleccionado)]
-else:
-    gdf_filtrado = gdf_estados
+# Filtro + tabla de estadísticas en una sola función cacheada por selección
+@st.cache_data(show_spinner=False, max_entries=64)
+def compute_stats(_gdf, mtime, seleccion):
+    # _gdf no se usa como llave del caché; mtime (versión de los datos) y la
+    # selección (tupla) sí.
+    # Máscara booleana sin operaciones geométricas: el área viene precalculada
+    if seleccion:
+        _gdf = _gdf.loc[_gdf['sta_name'].isin(seleccion)]
+    df = pd.DataFrame(_gdf[['sta_name', 'sta_code', 'sta_type', 'area_km2']])
+    # Columnas derivadas internas con eval sobre numexpr; no se muestran en la tabla
+    df = df.eval("area_rel = area_km2 / @area_media", engine="numexpr",
+                 local_dict={'area_media': df['area_km2'].mean()})
+    df = df.rename(columns={
+        'sta_name': 'Estado',
+        'sta_code': 'Código',
+        'sta_type': 'Tipo',
+        'area_km2': 'Área (km²)'
+    })
+    df['Área (km²)'] = df['Área (km²)'].round(2)
+    return df.sort_values('Área (km²)', ascending=False)
+
+df_estados = compute_stats(gdf_estados, estados_mtime, tuple(sorted(estado_seleccionado)))
 
 # ================== SECCIÓN DE ANÁLISIS DE DATOS ==================
 st.sidebar.header("📊 Análisis de Datos")
 
 st.subheader("📋 Información Estadística por Estado")
-if not gdf_filtrado.empty:
-    # Crear DataFrame con información relevante
-    df_estados = pd.DataFrame({
-        'Estado': gdf_filtrado['sta_name'],
-        'Código': gdf_filtrado['sta_code'],
-        'Tipo': gdf_filtrado['sta_type'],
-        'Área (km²)': round(gdf_filtrado.geometry.to_crs(epsg=6933).area / 10**6, 2)  # Convertir a km² usando proyección métrica
-    })
-
+if not df_estados.empty:
     # Mostrar DataFrame con filtros
     col1, col2 = st.columns([3, 1])
     with col1:
-        st.dataframe(df_estados.sort_values('Área (km²)', ascending=False),
+        st.dataframe(df_estados.drop(columns='area_rel'),
                     height=400,
                     use_container_width=True)
     with col2:
-        st.metric("Estado más extenso", df_estados.loc[df_estados['Área (km²)'].idxmax(), 'Estado'])
-        st.metric("Área máxima (km²)", df_estados['Área (km²)'].max())
-        st.metric("Área promedio (km²)", round(df_estados['Área (km²)'].mean(), 2))
+        # Métricas directamente sobre el arreglo de numpy
+        areas = df_estados['Área (km²)'].to_numpy()
+        i_max = areas.argmax()
+        st.metric("Estado más extenso", df_estados['Estado'].iat[i_max])
+        st.metric("Área máxima (km²)", float(areas[i_max]))
+        st.metric("Área promedio (km²)", round(float(areas.mean()), 2))
 
 # 2. Gráfico de áreas por estado
 st.subheader("📈 Distribución de Áreas por Estado")
-fig, ax = plt.subplots(figsize=(10, 6))
-df_estados.sort_values('Área (km²)', ascending=True).plot.barh(
-    x='Estado',
-    y='Área (km²)',
-    ax=ax,
-    color='#3186cc',
-    legend=False
-)
-ax.set_xlabel('Área (kilómetros cuadrados)')
-ax.set_title('Área Territorial por Estado')
-st.pyplot(fig)
+# Gráficos renderizados en el navegador (Vega-Lite)
+def build_area_chart(df):
+    return alt.Chart(df).mark_bar(color='#3186cc').encode(
+        x=alt.X(field='Área (km²)', type='quantitative', title='Área (kilómetros cuadrados)'),
+        y=alt.Y(field='Estado', type='nominal', sort='-x', title=None),
+        tooltip=[alt.Tooltip(field='Estado', type='nominal'),
+                 alt.Tooltip(field='Área (km²)', type='quantitative')]
+    ).properties(title='Área Territorial por Estado')
+
+def build_type_chart(df):
+    return alt.Chart(df).mark_arc().encode(
+        theta=alt.Theta('Cantidad:Q'),
+        color=alt.Color('Tipo:N', scale=alt.Scale(range=['#4c72b0', '#55a868', '#c44e52'])),
+        tooltip=['Tipo', 'Cantidad']
+    )
+
+st.altair_chart(build_area_chart(df_estados[['Estado', 'Área (km²)']]), use_container_width=True)
 
 # 3. Análisis por tipo de estado
 st.subheader("🧩 Distribución por Tipo de Estado")
-if 'sta_type' in gdf_filtrado.columns:
-    tipo_counts = gdf_filtrado['sta_type'].value_counts()
+if 'sta_type' in gdf_estados.columns:
+    tipo_counts = df_estados['Tipo'].value_counts()
+    # Las categóricas reportan también los tipos sin estados seleccionados
+    tipo_counts = tipo_counts[tipo_counts > 0]
     col1, col2 = st.columns(2)
     with col1:
         st.dataframe(tipo_counts.rename("Cantidad"), width=300)
     with col2:
-        fig2, ax2 = plt.subplots()
-        tipo_counts.plot.pie(
-            autopct='%1.1f%%',
-            startangle=90,
-            ax=ax2,
-            colors=['#4c72b0', '#55a868', '#c44e52']
-        )
-        ax2.set_ylabel('')
-        st.pyplot(fig2)
+        df_tipos = tipo_counts.rename_axis('Tipo').reset_index(name='Cantidad')
+        st.altair_chart(build_type_chart(df_tipos), use_container_width=True)
 
 # ================== SECCIÓN DEL MAPA INTERACTIVO ==================
 st.subheader("🗺️ Mapa Interactivo")
@@ -124,21 +306,141 @@ with st.sidebar:
     st.header("⚙️ Controles del Mapa")
     capa_base = st.selectbox(
         "Capa Base",
-        ["CartoDB positron", "OpenStreetMap", "Stamen Terrain", "Stamen Toner"]
+        list(CAPAS_BASE)
     )
     mostrar_capitales = st.checkbox("Mostrar capitales", True)
     mostrar_herramientas = st.checkbox("Mostrar herramientas de dibujo", True)
 
-# Crear el mapa interactivo
-try:
+def vector_tile_options(seleccion, maxzoom):
+    # Opciones de VectorGrid como JS (incluye la función de estilo); los estados
+    # fuera de la selección no se dibujan
+    return """{
+        "interactive": true,
+        "maxNativeZoom": %d,
+        "getFeatureId": function (f) { return f.properties.sta_name; },
+        "vectorTileLayerStyles": {
+            "estados": function (properties) {
+                var seleccion = %s;
+                if (seleccion.length && seleccion.indexOf(properties.sta_name) === -1) {
+                    return {stroke: false, fill: false};
+                }
+                return {
+                    fill: true,
+                    fillColor: '#3186cc',
+                    color: '#0a4b8c',
+                    weight: 1.5,
+                    fillOpacity: 0.5
+                };
+            }
+        }
+    }""" % (maxzoom, json.dumps(list(seleccion)))
+
+class VectorTileTooltip(MacroElement):
+    # Tooltip con Estado / Código / Tipo y resaltado al pasar el mouse para la
+    # capa de teselas vectoriales (equivalente al highlight_function de GeoJson)
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        {{ this._parent.get_name() }}.bindTooltip('', {sticky: true});
+        {{ this._parent.get_name() }}.on('mouseover', function (e) {
+            var p = e.layer.properties;
+            {{ this._parent.get_name() }}.setFeatureStyle(p.sta_name, {
+                fill: true,
+                fillColor: '#3186cc',
+                color: '#ff0000',
+                weight: 3,
+                fillOpacity: 0.7
+            });
+            {{ this._parent.get_name() }}
+                .setTooltipContent('<div style="{{ this.style }}">'
+                    + '<b>Estado</b>: ' + p.sta_name + '<br>'
+                    + '<b>Código</b>: ' + p.sta_code + '<br>'
+                    + '<b>Tipo</b>: ' + p.sta_type + '</div>')
+                .openTooltip(e.latlng);
+        });
+        {{ this._parent.get_name() }}.on('mouseout', function (e) {
+            {{ this._parent.get_name() }}.resetFeatureStyle(e.layer.properties.sta_name);
+            {{ this._parent.get_name() }}.closeTooltip();
+        });
+        {% endmacro %}
+    """)
+
+    def __init__(self, style):
+        super().__init__()
+        self._name = "VectorTileTooltip"
+        self.style = " ".join(style.split())
+
+def add_draw_tools(m):
+    # La librería Leaflet.draw se enlaza desde CDN (folium la agrega como
+    # <script src>); en el HTML del mapa solo queda la inicialización del control
+    Draw(
+        export=True,
+        position='topleft',
+        draw_options={
+            'polyline': True,
+            'polygon': True,
+            'circle': False,
+            'marker': True,
+            'rectangle': True
+        }
+    ).add_to(m)
+
+class LazyGeoJsonLayer(MacroElement):
+    # Descarga un GeoJSON de puntos y lo agrega a la capa en el navegador (el HTML
+    # no incluye los datos): al cargar si la capa está visible, o cuando el
+    # usuario la activa en el control de capas (evento overlayadd)
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }}_cargado = false;
+        function {{ this.get_name() }}_cargar() {
+            if ({{ this.get_name() }}_cargado) {
+                return;
+            }
+            {{ this.get_name() }}_cargado = true;
+            fetch({{ this.url|tojson }})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    L.geoJson(data, {
+                        pointToLayer: function (feature, latlng) {
+                            var icon = L.AwesomeMarkers.icon({icon: 'star', markerColor: 'red'});
+                            return L.marker(latlng, {icon: icon})
+                                .bindPopup('<b>' + feature.properties.nombre + '</b>');
+                        }
+                    }).addTo({{ this.layer.get_name() }});
+                })
+                .catch(function () { {{ this.get_name() }}_cargado = false; });
+        }
+        if ({{ this._parent.get_name() }}.hasLayer({{ this.layer.get_name() }})) {
+            {{ this.get_name() }}_cargar();
+        }
+        {{ this._parent.get_name() }}.on('overlayadd', function (e) {
+            if (e.layer === {{ this.layer.get_name() }}) {
+                {{ this.get_name() }}_cargar();
+            }
+        });
+        {% endmacro %}
+    """)
+
+    def __init__(self, layer, url):
+        super().__init__()
+        self._name = "LazyGeoJsonLayer"
+        self.layer = layer
+        self.url = url
+
+# Construir y renderizar el mapa a HTML una sola vez por combinación de controles
+# Límite de entradas: cada una guarda el HTML completo del mapa (~400 KB)
+@st.cache_resource(show_spinner=False, max_entries=16)
+def build_map(filepath, mtime, tiles_maxzoom, capa_base, mostrar_capitales, mostrar_herramientas, seleccion):
+    # mtime (versión de los datos) y tiles_maxzoom (None si no hay teselas)
+    # forman parte de la llave junto con los controles y la selección (tupla)
     # Configuración inicial del mapa
     m = folium.Map(
         location=[23.6345, -102.5528],
         zoom_start=5,
-        tiles=capa_base,
-        control_scale=True,
-        attr="CartoDB attribution"
+        tiles=None,
+        control_scale=True
     )
+    tiles, attr = CAPAS_BASE[capa_base]
+    folium.TileLayer(tiles, name=capa_base, attr=attr).add_to(m)
 
     # Definir estilo para los tooltips
     tooltip_style = """
@@ -154,27 +456,38 @@ try:
     """
 
     # Capa principal de estados con colores según área
-    estados_layer = folium.GeoJson(
-        gdf_filtrado,
-        name="Estados",
-        style_function=lambda x: {
-            'fillColor': '#3186cc',
-            'color': '#0a4b8c',
-            'weight': 1.5,
-            'fillOpacity': 0.5
-        },
-        highlight_function=lambda x: {
-            'weight': 3,
-            'fillOpacity': 0.7,
-            'color': '#ff0000'
-        },
-        tooltip=folium.GeoJsonTooltip(
-            fields=["sta_name", "sta_code", "sta_type"],
-            aliases=["<b>Estado</b>:", "<b>Código</b>:", "<b>Tipo</b>:"],
-            style=tooltip_style,
-            sticky=True
-        )
-    ).add_to(m)
+    if tiles_maxzoom is not None:
+        # Teselas vectoriales: el navegador solo descarga las de la vista actual
+        estados_layer = VectorGridProtobuf(
+            TILES_URL,
+            "Estados",
+            vector_tile_options(seleccion, tiles_maxzoom)
+        ).add_to(m)
+        VectorTileTooltip(tooltip_style).add_to(estados_layer)
+    else:
+        # Solo sin teselas se serializan los estados a GeoJSON
+        geojson_mapa = join_features(load_state_features(filepath, mtime), seleccion)
+        estados_layer = folium.GeoJson(
+            geojson_mapa,
+            name="Estados",
+            style_function=lambda x: {
+                'fillColor': '#3186cc',
+                'color': '#0a4b8c',
+                'weight': 1.5,
+                'fillOpacity': 0.5
+            },
+            highlight_function=lambda x: {
+                'weight': 3,
+                'fillOpacity': 0.7,
+                'color': '#ff0000'
+            },
+            tooltip=folium.GeoJsonTooltip(
+                fields=["sta_name", "sta_code", "sta_type"],
+                aliases=["<b>Estado</b>:", "<b>Código</b>:", "<b>Tipo</b>:"],
+                style=tooltip_style,
+                sticky=True
+            )
+        ).add_to(m)
 
     # ================== FUNCIONALIDADES AVANZADAS ==================
 
@@ -199,17 +512,7 @@ try:
 
     # 3. Plugin de Dibujo (condicional)
     if mostrar_herramientas:
-        Draw(
-            export=True,
-            position='topleft',
-            draw_options={
-                'polyline': True,
-                'polygon': True,
-                'circle': False,
-                'marker': True,
-                'rectangle': True
-            }
-        ).add_to(m)
+        add_draw_tools(m)
 
     # 4. Plugin de Fullscreen
     Fullscreen(
@@ -221,49 +524,37 @@ try:
 
     # 5. Marcadores de capitales (condicional)
     if mostrar_capitales:
+        # La capa se agrega sin datos; las capitales se descargan al cargar el mapa
         marker_cluster = MarkerCluster(name="Capitales").add_to(m)
+        LazyGeoJsonLayer(marker_cluster, CAPITALES_URL).add_to(m)
 
-        # Ejemplo con algunas capitales
-        capitales = {
-            "CDMX": (19.4326, -99.1332),
-            "Guadalajara": (20.6597, -103.3496),
-            "Monterrey": (25.6866, -100.3161),
-            "Puebla": (19.0414, -98.2063),
-            "Tijuana": (32.5149, -117.0382),
-            "León": (21.1250, -101.6860)
-        }
-
-        for capital, coords in capitales.items():
-            folium.Marker(
-                location=coords,
-                popup=f"<b>{capital}</b>",
-                icon=folium.Icon(color='red', icon='star')
-            ).add_to(marker_cluster)
-
-    # 6. Múltiples capas base CON ATRIBUCIONES
-    folium.TileLayer(
-        'OpenStreetMap',
-        name='OpenStreetMap',
-        attr='&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
-    ).add_to(m)
-
-    folium.TileLayer(
-        'Stamen Terrain',
-        name='Stamen Terrain',
-        attr='Map tiles by <a href="http://stamen.com">Stamen Design</a>, under <a href="http://creativecommons.org/licenses/by/3.0">CC BY 3.0</a>. Data by <a href="http://openstreetmap.org">OpenStreetMap</a>, under <a href="http://www.openstreetmap.org/copyright">ODbL</a>.'
-    ).add_to(m)
-
-    folium.TileLayer(
-        'Stamen Toner',
-        name='Stamen Toner',
-        attr='Map tiles by <a href="http://stamen.com">Stamen Design</a>, under <a href="http://creativecommons.org/licenses/by/3.0">CC BY 3.0</a>. Data by <a href="http://openstreetmap.org">OpenStreetMap</a>, under <a href="http://www.openstreetmap.org/copyright">ODbL</a>.'
-    ).add_to(m)
+    # 6. Múltiples capas base CON ATRIBUCIONES (sin repetir la capa inicial)
+    extra_tiles = [nombre for nombre in EXTRA_TILES if nombre != capa_base]
+    for nombre in extra_tiles:
+        tiles, attr = CAPAS_BASE[nombre]
+        # show=False: solo se descargan teselas al elegirla en el control de capas
+        folium.TileLayer(tiles, name=nombre, attr=attr, show=False).add_to(m)
 
     # Control de capas
     folium.LayerControl().add_to(m)
 
+    return m.get_root().render()
+
+# Crear el mapa interactivo
+try:
+    # Dentro del try: un error al serializar solo desactiva el mapa
+    mapa_html = build_map(
+        estados_file,
+        estados_mtime,
+        load_tiles_maxzoom(TILES_DIR),
+        capa_base,
+        mostrar_capitales,
+        mostrar_herramientas,
+        tuple(sorted(estado_seleccionado))
+    )
 except Exception as e:
     st.error(f"Error al crear el mapa: {str(e)}")
+    st.stop()
 
-# Mostrar el mapa en Streamlit
-st_folium(m, width=1000, height=600)
+# Mostrar el mapa en Streamlit (solo de ida: no se lee estado de regreso)
+components.html(mapa_html, width=1000, height=600)
@@ -0,0 +1,22 @@
+#!/bin/sh
+# Genera la pirámide de teselas vectoriales (MVT/PBF) de los estados en
+# static/tiles/estados; Streamlit la sirve en /app/static/tiles/estados.
+# Requiere tippecanoe: https://github.com/felt/tippecanoe (en Heroku se instala
+# desde Aptfile con el buildpack heroku-community/apt; el Procfile lo ejecuta al iniciar)
+set -e
+
+if ! command -v tippecanoe >/dev/null 2>&1; then
+    echo "tippecanoe no está instalado; no se modificaron las teselas" >&2
+    exit 1
+fi
+
+rm -rf static/tiles/estados
+
+tippecanoe \
+    --output-to-directory=static/tiles/estados \
+    --layer=estados \
+    --maximum-zoom=g \
+    --no-tile-compression \
+    --detect-shared-borders \
+    --include=sta_name --include=sta_code --include=sta_type \
+    georef-mexico-state.geojson